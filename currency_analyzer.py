@@ -3,11 +3,16 @@
 Получает курсы с API ЦБ РФ и анализирует изменения
 """
 
-import requests
-import pandas as pd
-import json
-from datetime import datetime, timedelta
+import gzip
+import csv
+import numpy as np
+import orjson
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
 import os
+import sys
+import urllib.error
+import urllib.request
 # Все доступные валюты
 ALL_CURRENCIES = {
     'USD': 'Доллар США',
@@ -31,27 +36,161 @@ ALL_CURRENCIES = {
     'ZAR': 'Южноафриканский рэнд',
     'KRW': 'Южнокорейская вона'
 }
-print("="*60)
-print("💰 АНАЛИЗАТОР КУРСОВ ВАЛЮТ")
-print("="*60)
-print(f"📅 {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-print()
 
 # API для курсов валют (сайт ЦБ РФ)
 API_URL = "https://www.cbr-xml-daily.ru/daily_json.js"
 
-def get_exchange_rates():
-    """Получает текущие курсы валют"""
+# Кэш ответа ЦБ РФ: курсы обновляются раз в рабочий день, поэтому повторные
+# запуски отправляют условный запрос и при 304 берут данные с диска
+CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "currency_analyzer")
+CACHE_FILE = os.path.join(CACHE_DIR, "cache.json")
+CACHE_META_FILE = os.path.join(CACHE_DIR, "cache_meta.json")
+
+def _load_cache_meta():
+    """Читает ETag/Last-Modified последнего ответа, если кэш на месте"""
+    if not (os.path.exists(CACHE_FILE) and os.path.exists(CACHE_META_FILE)):
+        return {}
+    try:
+        with open(CACHE_META_FILE, 'rb') as f:
+            return orjson.loads(f.read())
+    except (OSError, orjson.JSONDecodeError):
+        return {}
+
+def _read_cached_document():
+    """Читает и разбирает сохранённый ответ; None, если файла нет или он повреждён"""
+    try:
+        with open(CACHE_FILE, 'rb') as f:
+            return orjson.loads(f.read())
+    except (OSError, orjson.JSONDecodeError):
+        return None
+
+def _clear_cache():
+    """Удаляет файлы кэша, чтобы следующий запрос был безусловным"""
+    for path in (CACHE_FILE, CACHE_META_FILE):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+def _atomic_write(path, payload):
+    """Записывает файл через временный, чтобы не оставить его обрезанным"""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(payload)
+    os.replace(tmp_path, path)
+
+def _store_cache(raw, response_headers):
+    """Сохраняет тело ответа и его заголовки валидации в кэш
+
+    Возвращает предупреждение, если кэш записать не удалось, иначе None.
+    """
+    meta = {
+        'etag': response_headers.get('ETag'),
+        'last_modified': response_headers.get('Last-Modified'),
+    }
+    if not (meta['etag'] or meta['last_modified']):
+        return None
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        _atomic_write(CACHE_FILE, raw)
+        _atomic_write(CACHE_META_FILE, orjson.dumps(meta))
+    except OSError as e:
+        return f"⚠️ Не удалось сохранить кэш: {e}"
+    return None
+
+def _fetch_payload(conditional=True):
+    """Скачивает и разбирает JSON ЦБ РФ
+
+    Возвращает (документ, взят ли он из кэша, предупреждение или None).
+    Функция может работать в фоновом потоке, поэтому сама ничего не печатает.
+    Если сервер ответил 304, а кэш пропал или повреждён, кэш удаляется
+    и запрос повторяется один раз без условных заголовков.
+    """
+    meta = _load_cache_meta() if conditional else {}
+    headers = {'Accept-Encoding': 'gzip'}
+    if meta.get('etag'):
+        headers['If-None-Match'] = meta['etag']
+    if meta.get('last_modified'):
+        headers['If-Modified-Since'] = meta['last_modified']
+    
+    request = urllib.request.Request(API_URL, headers=headers)
+    try:
+        with urllib.request.urlopen(request, timeout=10) as response:
+            raw = response.read()
+            if response.headers.get('Content-Encoding') == 'gzip':
+                raw = gzip.decompress(raw)
+            response_headers = response.headers
+    except urllib.error.HTTPError as e:
+        if e.code != 304 or not conditional:
+            raise
+        document = _read_cached_document()
+        if document is None:
+            _clear_cache()
+            return _fetch_payload(conditional=False)
+        return document, True, None
+    
+    document = orjson.loads(raw)
+    warning = _store_cache(raw, response_headers)
+    return document, False, warning
+
+def get_exchange_rates(selected_currencies=None, payload_future=None):
+    """Получает текущие курсы валют (только выбранных, если они указаны)
+
+    payload_future - уже запущенная в фоне загрузка _fetch_payload,
+    если её нет, данные скачиваются сразу.
+    """
     try:
         print("🌐 Получаем текущие курсы валют...")
-        response = requests.get(API_URL, timeout=10)
-        data = response.json()
-        print("✅ Данные успешно получены!")
+        if payload_future is not None:
+            data, from_cache, warning = payload_future.result()
+        else:
+            data, from_cache, warning = _fetch_payload()
+        if warning:
+            print(warning)
+        
+        if selected_currencies is not None:
+            # Оставляем только нужные валюты из блока Valute
+            valute = data['Valute']
+            data = {'Valute': {code: valute[code] for code in selected_currencies if code in valute}}
+        if from_cache:
+            print("✅ Данные не изменились, используем кэш")
+        else:
+            print("✅ Данные успешно получены!")
         return data
     except Exception as e:
         print(f"❌ Ошибка: {e}")
         return None
 
+# Рекомендации по возрастанию изменения курса: индекс вычисляет _recommendation_bucket
+RECOMMENDATIONS = np.array([
+    "📉 СИЛЬНОЕ ПАДЕНИЕ - ОЧЕНЬ выгодно покупать",
+    "📉 Падение - выгодно покупать",
+    "➡️ Без изменений",
+    "📈 Рост - выгодно продавать",
+    "📈 СИЛЬНЫЙ РОСТ - ОЧЕНЬ выгодно продавать",
+])
+
+def _recommendation_bucket(change):
+    """Номер рекомендации для массива изменений без ветвлений
+
+    0 - падение больше 0.01, 1 - падение, 2 - без изменений,
+    3 - рост, 4 - рост больше 0.01
+    """
+    return (2 + np.sign(change) + (change > 0.01) - (change < -0.01)).astype(np.intp)
+
+def _compute(values, previous):
+    """Изменение курса, изменение в процентах и номер рекомендации"""
+    change = values - previous
+    safe_previous = np.where(previous != 0, previous, 1.0)
+    change_percent = np.where(previous != 0, change / safe_previous * 100, 0.0)
+    return change, change_percent, _recommendation_bucket(change)
+
+def _missing_message(missing):
+    """Формирует одно сообщение о валютах, которых нет в данных ЦБ РФ"""
+    if not missing:
+        return ""
+    return f"⚠️ Валюты не найдены в данных ЦБ РФ: {', '.join(missing)}\n"
+
 def analyze_currencies(data, selected_currencies=None):
     """Анализирует курсы выбранных валют"""
     if not data or 'Valute' not in data:
@@ -61,54 +200,65 @@ def analyze_currencies(data, selected_currencies=None):
     if selected_currencies is None:
         selected_currencies = ['USD', 'EUR', 'CNY', 'GBP', 'JPY']
     
-    print(f"\n📊 АНАЛИЗ КУРСОВ ВАЛЮТ ({len(selected_currencies)} валют):")
-    print("-" * 60)
-    
-    currencies = []
-    available_count = 0
-    
-    for code in selected_currencies:
-        if code in data['Valute']:
-            currency = data['Valute'][code]
-            available_count += 1
-            
-
-            change = currency['Value'] - currency['Previous']
-            change_percent = (change / currency['Previous']) * 100 if currency['Previous'] != 0 else 0
-            
-
-            if change > 0.01:  # Значительный рост
-                recommendation = "📈 СИЛЬНЫЙ РОСТ - ОЧЕНЬ выгодно продавать"
-            elif change > 0:
-                recommendation = "📈 Рост - выгодно продавать"
-            elif change < -0.01:  # Значительное падение
-                recommendation = "📉 СИЛЬНОЕ ПАДЕНИЕ - ОЧЕНЬ выгодно покупать"
-            elif change < 0:
-                recommendation = "📉 Падение - выгодно покупать"
-            else:
-                recommendation = "➡️ Без изменений"
-            
-            currency_info = {
-                'Код': code,
-                'Название': currency['Name'],
-                'Курс': round(currency['Value'], 4),
-                'Изменение': round(change, 4),
-                'Изменение %': round(change_percent, 2),
-                'Рекомендация': recommendation,
-                'Номинал': currency['Nominal']
-            }
-            
-            currencies.append(currency_info)
-            
-            print(f"{code} ({currency['Name']}):")
-            print(f"  Курс: {currency['Value']:.4f} ₽ за {currency['Nominal']} ед.")
-            print(f"  Изменение: {change:+.4f} ₽ ({change_percent:+.2f}%)")
-            print(f"  {recommendation}")
-            print()
-        else:
-            print(f"⚠️ Валюта {code} не найдена в данных ЦБ РФ")
+    # Весь вывод копится в списке и печатается одним вызовом
+    out = [
+        f"\n📊 АНАЛИЗ КУРСОВ ВАЛЮТ ({len(selected_currencies)} валют):\n",
+        "-" * 60 + "\n",
+    ]
+    
+    valute = data['Valute']
+    hits = [(code, currency) for code in selected_currencies
+            if (currency := valute.get(code)) is not None]
+    missing = [code for code in dict.fromkeys(selected_currencies) if code not in valute]
+    
+    if not hits:
+        out.append(_missing_message(missing))
+        out.append(f"✅ Обработано 0 из {len(selected_currencies)} запрошенных валют\n")
+        sys.stdout.write("".join(out))
+        return None
     
-    print(f"✅ Обработано {available_count} из {len(selected_currencies)} запрошенных валют")
+    # Значения хранятся по столбцам, расчёт выполняется одной векторной операцией
+    codes = [code for code, _ in hits]
+    names = [currency['Name'] for _, currency in hits]
+    values = np.fromiter((currency['Value'] for _, currency in hits), dtype=np.float64, count=len(hits))
+    previous = np.fromiter((currency['Previous'] for _, currency in hits), dtype=np.float64, count=len(hits))
+    nominals = np.fromiter((currency['Nominal'] for _, currency in hits), dtype=np.int64, count=len(hits))
+    
+    change, change_percent, bucket = _compute(values, previous)
+    recommendations = RECOMMENDATIONS[bucket]
+    
+    for i, code in enumerate(codes):
+        out.append(
+            f"{code} ({names[i]}):\n"
+            f"  Курс: {values[i]:.4f} ₽ за {nominals[i]} ед.\n"
+            f"  Изменение: {change[i]:+.4f} ₽ ({change_percent[i]:+.2f}%)\n"
+            f"  {recommendations[i]}\n"
+            "\n"
+        )
+    
+    currencies = [
+        {
+            'Код': code,
+            'Название': name,
+            'Курс': value,
+            'Изменение': delta,
+            'Изменение %': percent,
+            'Рекомендация': recommendation,
+            'Номинал': nominal
+        }
+        for code, name, value, delta, percent, recommendation, nominal in zip(
+            codes, names,
+            values.round(4).tolist(),
+            change.round(4).tolist(),
+            change_percent.round(2).tolist(),
+            recommendations.tolist(),
+            nominals.tolist()
+        )
+    ]
+    
+    out.append(_missing_message(missing))
+    out.append(f"✅ Обработано {len(codes)} из {len(selected_currencies)} запрошенных валют\n")
+    sys.stdout.write("".join(out))
     return currencies
 def save_to_csv(currencies, filename="currency_rates.csv"):
     """Сохраняет данные в CSV"""
@@ -116,73 +266,99 @@ def save_to_csv(currencies, filename="currency_rates.csv"):
         print("❌ Нет данных для сохранения")
         return None
     
-    df = pd.DataFrame(currencies)
-    df.to_csv(filename, index=False, encoding='utf-8-sig')
+    with open(filename, 'w', encoding='utf-8-sig', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=currencies[0].keys())
+        writer.writeheader()
+        writer.writerows(currencies)
     print(f"💾 Данные сохранены в {filename}")
     
 
-    df.to_json("currency_rates.json", orient='records', force_ascii=False, indent=2)
+    with open("currency_rates.json", 'wb') as f:
+        f.write(orjson.dumps(currencies, option=orjson.OPT_INDENT_2))
     print("💾 Данные также сохранены в currency_rates.json")
     
-    return df
+    return currencies
 
-def generate_report(df):
-    """Генерирует отчёт"""
-    print("\n📈 АНАЛИТИЧЕСКИЙ ОТЧЁТ:")
-    print("-" * 50)
+def generate_report(currencies, now=None):
+    """Генерирует отчёт (now - время отчёта, по умолчанию текущее)"""
+    if now is None:
+        now = datetime.now()
+    out = [
+        "\n📈 АНАЛИТИЧЕСКИЙ ОТЧЁТ:\n",
+        "-" * 50 + "\n",
+    ]
     
 
-    best_to_buy = df[df['Изменение'] < 0].sort_values('Изменение').head(1)
-    if not best_to_buy.empty:
-        currency = best_to_buy.iloc[0]
-        print(f"💰 Лучшая валюта для ПОКУПКИ: {currency['Код']}")
-        print(f"   Курс: {currency['Курс']} ₽")
-        print(f"   Изменение: {currency['Изменение']:+.4f} ₽")
-        print(f"   Причина: курс упал, можно купить дешевле")
+    lowest = min(currencies, key=lambda c: c['Изменение'])
+    highest = max(currencies, key=lambda c: c['Изменение'])
+    best_to_buy = lowest if lowest['Изменение'] < 0 else None
+    best_to_sell = highest if highest['Изменение'] > 0 else None
     
-    print()
+    if best_to_buy is not None:
+        currency = best_to_buy
+        out.append(
+            f"💰 Лучшая валюта для ПОКУПКИ: {currency['Код']}\n"
+            f"   Курс: {currency['Курс']} ₽\n"
+            f"   Изменение: {currency['Изменение']:+.4f} ₽\n"
+            "   Причина: курс упал, можно купить дешевле\n"
+        )
     
-    best_to_sell = df[df['Изменение'] > 0].sort_values('Изменение', ascending=False).head(1)
-    if not best_to_sell.empty:
-        currency = best_to_sell.iloc[0]
-        print(f"💰 Лучшая валюта для ПРОДАЖИ: {currency['Код']}")
-        print(f"   Курс: {currency['Курс']} ₽")
-        print(f"   Изменение: {currency['Изменение']:+.4f} ₽")
-        print(f"   Причина: курс вырос, можно продать дороже")
+    out.append("\n")
     
-    print()
+    if best_to_sell is not None:
+        currency = best_to_sell
+        out.append(
+            f"💰 Лучшая валюта для ПРОДАЖИ: {currency['Код']}\n"
+            f"   Курс: {currency['Курс']} ₽\n"
+            f"   Изменение: {currency['Изменение']:+.4f} ₽\n"
+            "   Причина: курс вырос, можно продать дороже\n"
+        )
+    
+    out.append("\n")
+    
+    rate_by_code = {c['Код']: c['Курс'] for c in currencies}
     
-    print("📊 ОБЩАЯ СТАТИСТИКА:")
-    print(f"   • Средний курс доллара: {df[df['Код'] == 'USD']['Курс'].values[0]} ₽")
-    print(f"   • Средний курс евро: {df[df['Код'] == 'EUR']['Курс'].values[0]} ₽")
-    print(f"   • Всего отслеживаемых валют: {len(df)}")
+    out.append(
+        "📊 ОБЩАЯ СТАТИСТИКА:\n"
+        f"   • Средний курс доллара: {rate_by_code.get('USD', 'нет данных')} ₽\n"
+        f"   • Средний курс евро: {rate_by_code.get('EUR', 'нет данных')} ₽\n"
+        f"   • Всего отслеживаемых валют: {len(currencies)}\n"
+    )
     
-    report_text = f"""
+    report_parts = [f"""
     ОТЧЁТ ПО КУРСАМ ВАЛЮТ
     ======================
-    Дата: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
+    Дата: {now.strftime('%Y-%m-%d %H:%M:%S')}
     
     РЕКОМЕНДАЦИИ:
-    1. Для покупки: {best_to_buy['Код'].values[0] if not best_to_buy.empty else 'Нет вариантов'}
-    2. Для продажи: {best_to_sell['Код'].values[0] if not best_to_sell.empty else 'Нет вариантов'}
+    1. Для покупки: {best_to_buy['Код'] if best_to_buy is not None else 'Нет вариантов'}
+    2. Для продажи: {best_to_sell['Код'] if best_to_sell is not None else 'Нет вариантов'}
     
     КУРСЫ ВАЛЮТ:
-    """
+    """]
     
-    for _, row in df.iterrows():
-        report_text += f"\n{row['Код']}: {row['Курс']} ₽ ({row['Изменение']:+.4f} ₽)"
+    report_parts.append("".join(
+        f"\n{row['Код']}: {row['Курс']} ₽ ({row['Изменение']:+.4f} ₽)" for row in currencies
+    ))
     
     with open('currency_report.txt', 'w', encoding='utf-8') as f:
-        f.write(report_text)
+        f.write("".join(report_parts))
     
-    print("📄 Подробный отчёт сохранён в currency_report.txt")
+    out.append("📄 Подробный отчёт сохранён в currency_report.txt\n")
+    sys.stdout.write("".join(out))
 
 def main():
     """Основная деф проекта"""
+    # Загрузка курсов идёт в фоне, пока пользователь выбирает режим
+    executor = ThreadPoolExecutor(max_workers=1)
+    payload_future = executor.submit(_fetch_payload)
+    executor.shutdown(wait=False)
+    
+    now = datetime.now()
     print("="*60)
     print("💰 РАСШИРЕННЫЙ АНАЛИЗАТОР КУРСОВ ВАЛЮТ")
     print("="*60)
-    print(f"📅 {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+    print(f"📅 {now.strftime('%Y-%m-%d %H:%M:%S')}")
     print()
     
     print("🌍 ДОСТУПНЫЕ ВАЛЮТЫ ДЛЯ АНАЛИЗА:")
@@ -226,7 +402,9 @@ def main():
     
     print("\n🚀 Запуск анализа...")
     
-    data = get_exchange_rates()
+    # Для полного анализа нужен весь документ, иначе разбираем только выбранные валюты
+    full_analysis = set(selected) >= ALL_CURRENCIES.keys()
+    data = get_exchange_rates(None if full_analysis else selected, payload_future)
     
     if not data:
         print("❌ Не удалось получить данные. Проверьте подключение к интернету.")
@@ -239,15 +417,15 @@ def main():
         return
     
     filename = f"currency_rates_{len(selected)}_currencies.csv"
-    df = save_to_csv(currencies, filename)
+    save_to_csv(currencies, filename)
     
-    generate_report(df)
+    generate_report(currencies, now)
     
     print("\n" + "="*60)
     print("✅ АНАЛИЗ ЗАВЕРШЁН!")
     print("="*60)
     print(f"\n📁 Созданные файлы:")
-    print(f"• {filename} - данные по {len(df)} валютам")
+    print(f"• {filename} - данные по {len(currencies)} валютам")
     print("• currency_rates.json - данные в JSON")
     print("• currency_report.txt - текстовый отчёт")
     print("\n🎯 Для визуализации запустите Jupyter Notebook")